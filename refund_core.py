@@ -0,0 +1,364 @@
+"""
+EV Charging AutoRefund 共用核心 (login / fetch_bills / refund_bill)
+autoRefund.py 與 auto_refund.py 皆由此呼叫 run()
+依賴: pip install python-dotenv requests loguru orjson
+"""
+
+import os
+import sys
+import json
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from datetime import date
+from pathlib import Path
+from typing import Dict, Any, List, Optional, TextIO, Tuple
+import orjson
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+from dotenv import load_dotenv
+from loguru import logger
+
+# 全域變數
+auth_token: Optional[str] = None
+REFUND_WORKERS = 8  # 同時進行的退款請求數上限
+TOKEN_TTL = 3600  # token 快取有效秒數
+
+
+class AuthError(Exception):
+    """token 失效 (HTTP 401/403)，需重新登入"""
+
+# 配置
+load_dotenv()
+BASE_URL = os.getenv("BASE_URL")
+USERNAME = os.getenv("USERNAME")
+PASSWORD_HASH = os.getenv("PASSWORD_HASH")
+SELLER_NUMBER = os.getenv("SELLER_NUMBER")
+COOKIE_VALUE = os.getenv("COOKIE")
+
+# 執行日 (程式啟動時計算一次)
+TODAY = date.today()
+TODAY_STR = TODAY.strftime("%Y-%m-%d")
+TODAY_COMPACT = TODAY.strftime("%Y%m%d")
+TODAY_COMPACT_BYTES = TODAY_COMPACT.encode()  # 退款 note 用
+
+# 必要檢查
+required = ["BASE_URL", "USERNAME", "PASSWORD_HASH"]
+missing = [k for k, v in locals().items() if isinstance(k, str) and k in required and v is None]
+if missing:
+    print(f"❌ .env missing: {', '.join(missing)}")  # logger 未初始化前用 print
+    sys.exit(1)
+
+# API 端點與固定 headers (import 時建立一次)
+LOGIN_URL = f"{BASE_URL}/api/config-service/user/login"
+BILLS_URL = f"{BASE_URL}/api/statistics-service/billDetailStatisticsController/page"
+REFUND_URL = f"{BASE_URL}/api/bill-service/bill/billRefund"
+# 退款 body 只有 billId / refundMoney / note 日期會變，直接格式化 bytes (%d 僅接受 int，不需跳脫)
+_REFUND_TMPL = (b'{"billId":%d,"memberId":null,"refundMoney":%d,'
+                b'"note":"python-refund-%d-%s","refundPowerDiscount":0}')
+# 固定 note 版本，note 需先以 orjson.dumps 編碼為 JSON 字串
+_REFUND_NOTE_TMPL = (b'{"billId":%d,"memberId":null,"refundMoney":%d,'
+                     b'"note":%s,"refundPowerDiscount":0}')
+BASE_HEADERS = {
+    "accept": "application/json",
+    "content-type": "application/json",  # body 皆以 data= 送出 (login/fetch 用 orjson.dumps，退款用 _REFUND_*TMPL)
+}
+# 瀏覽器 headers (auto_refund.py 沿用後台網頁送出的 headers)
+BROWSER_HEADERS = {
+    "accept-language": "zh-TW",
+    "origin": BASE_URL,
+    "priority": "u=1, i",
+    "referer": f"{BASE_URL}/Operation/ChargingOrder/OrderManagement",
+    "sec-ch-ua": '"Not(A:Brand";v="8", "Chromium";v="144", "Google Chrome";v="144"',
+    "sec-ch-ua-mobile": "?0",
+    "sec-ch-ua-platform": '"macOS"',
+    "sec-fetch-dest": "empty",
+    "sec-fetch-mode": "cors",
+    "sec-fetch-site": "same-origin",
+    "user-agent": ("Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/537.36 "
+                   "(KHTML, like Gecko) Chrome/144.0.0.0 Safari/537.36"),
+}
+LOGIN_HEADERS = {
+    "origin": BASE_URL,
+    "referer": f"{BASE_URL}/login",
+    "authorization": None,  # 重新登入時不送出失效的 session token (None 會移除 session header)
+}
+
+LOG_DIR = Path.home() / "evcharging_logs"
+LOG_DIR.mkdir(exist_ok=True)
+# enqueue=True: 輸出交給背景執行緒，退款 worker 不必等待 stderr/磁碟 I/O
+# (loguru 結束時的 logger.remove 會清空佇列)
+logger.remove()
+console_sink_id = logger.add(sys.stderr, enqueue=True)
+logger.add(LOG_DIR / "bill_refund.log", rotation="1 day", level="INFO", enqueue=True,
+           format="{time:YYYY-MM-DD HH:mm:ss} | {level} | {message}")
+TOKEN_CACHE = LOG_DIR / ".token.json"
+
+# 共用 Session，同一 BASE_URL 重用 TCP/TLS 連線
+# billRefund 未確認為 idempotent：只重試「連線建立失敗」與 429/503 (伺服器未處理請求)。
+# read=0 / other=0：請求送出後的讀取逾時、SSLError 等錯誤一律不重試，避免退款被重送
+RETRY = Retry(total=3, connect=3, read=0, other=0, status=3, backoff_factor=0.5,
+              status_forcelist=[429, 503], allowed_methods=frozenset(["POST"]),
+              respect_retry_after_header=True, raise_on_status=False)
+ADAPTER = HTTPAdapter(pool_connections=1, pool_maxsize=REFUND_WORKERS * 2,
+                      max_retries=RETRY)
+session = requests.Session()
+session.mount("https://", ADAPTER)
+session.mount("http://", ADAPTER)
+session.headers.update(BASE_HEADERS)
+# LIFF_STORE 放入 cookie jar (而非 cookie header)，登入回應設定的 cookie 才會一併送出
+session.cookies.set("LIFF_STORE", COOKIE_VALUE)
+
+def use_token(token: str):
+    """設定全域 auth_token 並寫入 session headers"""
+    global auth_token
+    auth_token = token
+    session.headers["authorization"] = token
+
+def load_cached_token() -> Optional[str]:
+    """讀取未過期的快取 token，無則回傳 None"""
+    try:
+        with open(TOKEN_CACHE, encoding="utf-8") as f:
+            cached = json.load(f)
+        if time.time() < cached["exp"] - 60:
+            return cached["token"]
+    except (OSError, ValueError, KeyError, TypeError):
+        pass
+    return None
+
+def save_token(token: str):
+    """快取 token 至 TOKEN_CACHE (權限 0600)"""
+    try:
+        fd = os.open(TOKEN_CACHE, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+        with os.fdopen(fd, "w", encoding="utf-8") as f:
+            json.dump({"token": token, "exp": time.time() + TOKEN_TTL}, f)
+        os.chmod(TOKEN_CACHE, 0o600)
+    except OSError as e:
+        logger.warning("⚠️ Token cache write fail: {}", e)
+
+def clear_cached_token():
+    """刪除失效的快取 token"""
+    try:
+        TOKEN_CACHE.unlink()
+    except FileNotFoundError:
+        pass
+    except OSError as e:
+        logger.warning("⚠️ Token cache delete fail: {}", e)
+
+def login() -> Optional[str]:
+    """登入取得 auth token"""
+    payload = {
+        "account": USERNAME,
+        "password": PASSWORD_HASH,
+        "sellerNumber": SELLER_NUMBER,
+        "smsCaptchaPass": True,
+    }
+    
+    try:
+        resp = session.post(LOGIN_URL, headers=LOGIN_HEADERS, data=orjson.dumps(payload), timeout=30)
+        resp.raise_for_status()
+        data = orjson.loads(resp.content)
+        
+        if data.get("data"):
+            token = data["data"]
+            logger.info("✅ Login: {}", token[:20] + "...")
+            use_token(token)  # 更新全域
+            save_token(token)
+            return token
+        logger.error("❌ No token: {}", data)
+        return None
+        
+    except requests.RequestException as e:
+        logger.error("Login HTTP fail: {}", e)
+        return None
+    except Exception as e:
+        logger.error("Login fail: {}", e)
+        return None
+
+def fetch_bills(date_from: date, date_to: date) -> Optional[Dict[str, Any]]:
+    """抓取 date_from 00:00:00 至 date_to 23:59:59 billStatus=14 訂單 (headers 由 use_token 設定於 session)
+
+    token 失效時拋出 AuthError，由呼叫端重新登入
+    """
+    payload = {
+        "stationIds": [1227],
+        "memberCategorys": [1, 0],
+        "billStatus": [14],
+        "timeS": f"{date_from:%Y-%m-%d} 00:00:00",
+        "timeE": f"{date_to:%Y-%m-%d} 23:59:59",
+        "current": 1,
+        "pageSize": 50,
+        "busIdType": 1,
+    }
+    
+    try:
+        resp = session.post(BILLS_URL, data=orjson.dumps(payload), timeout=30)
+        if resp.status_code in (401, 403):
+            raise AuthError(resp.status_code)
+        resp.raise_for_status()
+        data = orjson.loads(resp.content)
+        total = data.get("totalCount", 0)
+        logger.info("🈶 Bills OK, total: {}", total)
+        return data
+        
+    except AuthError:
+        raise
+    except requests.RequestException as e:
+        logger.error("Fetch bills HTTP fail: {}", e)
+        return None
+    except Exception as e:
+        logger.error("Fetch bills fail: {}", e)
+        return None
+
+def process_refunds(bill_data: Dict[str, Any], note_json: Optional[bytes] = None):
+    """處理退款，跳過 actualMoney=0 (note_json 見 refund_bill)"""
+    total = bill_data.get("totalCount", 0)
+    logger.info("📊 {} bills found", total)
+    if total == 0:
+        logger.info("❌ No bills to process")
+        return
+    
+    bills = bill_data.get("data", [])
+    if not isinstance(bills, list):
+        logger.warning("⚠️ bills.data is not list: {}", type(bills))
+        return
+        
+    # 先一次篩出可退款的 (bill_id, amount)，再併發退款
+    refundable = [(int(b["id"]), int(b["actualMoney"])) for b in bills
+                  if b.get("id") and isinstance(b["id"], (int, str)) and b.get("actualMoney")]
+    skipped = len(bills) - len(refundable)
+    if skipped:
+        logger.info("🙈 skipped {} zero-amount/invalid bills", skipped)
+    
+    success, failed, auth_failed = refund_batch(refundable, note_json)
+    
+    # token 於退款途中失效 (快取 TTL 為本地估計值)：重新登入一次，重送被 401/403 拒絕的退款
+    if auth_failed:
+        logger.warning("🔑 {} refunds rejected by auth, re-login", len(auth_failed))
+        clear_cached_token()
+        if login():
+            retried_ok, retried_failed, auth_failed = refund_batch(auth_failed, note_json)
+            success += retried_ok
+            failed += retried_failed
+        failed += len(auth_failed)
+    
+    logger.info("🎉 Success:{}, Failed:{}, Skipped:{}", success, failed, skipped)
+
+def refund_batch(refundable: List[Tuple[int, int]],
+                 note_json: Optional[bytes] = None) -> Tuple[int, int, List[Tuple[int, int]]]:
+    """併發退款，回傳 (success, failed, 因 AuthError 失敗的 (bill_id, amount))"""
+    success, failed = 0, 0
+    auth_failed = []
+    
+    # 各 billId 退款互不相依，以執行緒池共用 session 併發送出 (I/O bound)
+    with ThreadPoolExecutor(max_workers=REFUND_WORKERS) as executor:
+        futures = {}
+        for bill_id, amt in refundable:
+            logger.info("💰 Processing {}: ${}", bill_id, amt)
+            futures[executor.submit(refund_bill, bill_id, amt, note_json)] = (bill_id, amt)
+        
+        for future in as_completed(futures):
+            try:
+                ok = future.result()
+            except AuthError:
+                auth_failed.append(futures[future])
+                continue
+            except Exception as e:
+                logger.error("    ❌ {} Worker error: {}", futures[future][0], e)
+                ok = False
+            if ok:
+                success += 1
+            else:
+                failed += 1
+    
+    return success, failed, auth_failed
+
+def refund_bill(bill_id: int, amount: int, note_json: Optional[bytes] = None) -> bool:
+    """執行單筆退款，token 失效 (401/403) 時拋出 AuthError
+
+    note_json: 已編碼的 JSON 字串 note；None 則使用 python-refund-{bill_id}-{YYYYMMDD}
+    """
+    if not auth_token:
+        logger.error("❌ No auth_token for refund")
+        return False
+        
+    if note_json is None:
+        payload = _REFUND_TMPL % (bill_id, amount, bill_id, TODAY_COMPACT_BYTES)
+    else:
+        payload = _REFUND_NOTE_TMPL % (bill_id, amount, note_json)
+    
+    try:
+        resp = session.post(REFUND_URL, data=payload, timeout=30)
+        body = resp.text[:200]  # 限制長度
+        
+        # urllib3 重試不會留下紀錄，退款需可稽核：記錄每次重試的狀態碼/錯誤
+        history = resp.raw.retries.history if resp.raw.retries else ()
+        if history:
+            logger.warning("    ↻ {} retried {}x: {}", bill_id, len(history),
+                           ", ".join(str(h.status or h.error) for h in history))
+        
+        if resp.status_code in (401, 403):
+            logger.error("    ❌ {} [{}] {}", bill_id, resp.status_code, body)
+            raise AuthError(resp.status_code)
+        if 200 <= resp.status_code < 300:
+            logger.success("    ✓ {} [{}] {}", bill_id, resp.status_code, body)
+            return True
+        else:
+            logger.error("    ❌ {} [{}] {}", bill_id, resp.status_code, body)
+            return False
+            
+    except AuthError:
+        raise
+    except requests.RequestException as e:
+        logger.error("    ❌ {} Request error: {}", bill_id, str(e)[:100])
+        return False
+    except Exception as e:
+        logger.error("    ❌ {} Unexpected: {}", bill_id, str(e))
+        return False
+
+def run(date_from: date, date_to: date, note: Optional[str] = None,
+        headers: Optional[Dict[str, str]] = None, console: Optional[TextIO] = None) -> bool:
+    """登入 (優先使用快取 token)、抓取區間內訂單並退款
+
+    note: 固定退款 note (預設 python-refund-{bill_id}-{YYYYMMDD})
+    headers: 額外加到 session 的 headers (如 BROWSER_HEADERS)
+    console: 取代預設 stderr 的 log 輸出串流 (如 sys.stdout)
+    回傳 False 表示登入失敗，exit code 由呼叫端決定
+    """
+    global console_sink_id
+    if console is not None:
+        logger.remove(console_sink_id)
+        console_sink_id = logger.add(console, level="INFO", enqueue=True,
+                                     format="{time:YYYY-MM-DD HH:mm:ss,SSS} [{level}] {message}")
+    logger.info("🚀 Python AutoRefund v2.0 - {} → {}", date_from, date_to)
+    if headers:
+        session.headers.update(headers)
+    note_json = orjson.dumps(note) if note is not None else None
+    
+    bill_data = None
+    cached_token = load_cached_token()
+    if cached_token:
+        use_token(cached_token)
+        try:
+            bill_data = fetch_bills(date_from, date_to)
+        except AuthError as e:
+            logger.info("🔑 Cached token rejected [{}], re-login", e)
+            clear_cached_token()
+            cached_token = None
+    
+    if not cached_token:
+        if not login():
+            logger.error("😫 Login failed")
+            return False
+        try:
+            bill_data = fetch_bills(date_from, date_to)
+        except AuthError as e:
+            logger.error("😫 Token rejected after login [{}]", e)
+    
+    if bill_data:
+        process_refunds(bill_data, note_json)
+    else:
+        logger.error("😫 No bill data")
+    
+    logger.info("🅾️ Done - {}", TODAY_STR)
+    return True